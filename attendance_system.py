@@ -9,216 +9,836 @@ import numpy as np
 from datetime import datetime, date
 from pathlib import Path
 import sys
+import os
+import threading
+import atexit
+import logging
+import logging.handlers
+import queue
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
 
 #add src to path
 sys.path.append(str(Path(__file__).parent / 'src'))
 from config import (
     STUDENTS_DB, REFERENCE_IDS_DIR, CAPTURED_DIR, CAMERA_INDEX,
-    FRAME_WIDTH, FRAME_HEIGHT, SCALE_FACTOR, MIN_NEIGHBORS, MIN_FACE_SIZE
+    FRAME_WIDTH, FRAME_HEIGHT, SCALE_FACTOR, MIN_NEIGHBORS, MIN_FACE_SIZE,
+    FACE_EMBEDDING_MODEL, EMBEDDING_INPUT_SIZE, EMBEDDING_THRESHOLD,
+    TEMPLATE_THRESHOLD, TEMPLATE_SIZE, OPENCV_THREADS, REFERENCE_CACHE,
+    FACE_DETECTOR_MODEL, FACE_DETECTOR_CONFIG, DETECTOR_INPUT_SIZE,
+    DETECTION_CONFIDENCE, SQLITE_PRAGMAS, DETECTION_SCALE, LBP_DETECTION_SCALE, DETECT_EVERY_N_FRAMES,
+    MOTION_SIZE, MOTION_THRESHOLD, MOTION_MIN_PIXELS, TEMPLATE_MATCHER, LBP_SIZE,
+    LBP_THRESHOLD, SYSTEM_LOG, LOG_LEVEL, LOG_FORMAT, DATE_FORMAT, USE_OPENCL,
+    LBP_CASCADE, HAAR_CASCADE, CAPTURE_FORMAT, CAPTURE_QUALITY, SAVE_ATTENDANCE_PHOTOS,
+    SAVE_QUEUE_SIZE
 )
 
+logger = logging.getLogger(__name__)
+
+#dnn backends to try, fastest first
+DNN_TARGETS = (
+    ('cuda fp16', cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16),
+    ('opencl fp16', cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_OPENCL_FP16),
+    ('cpu', cv2.dnn.DNN_BACKEND_OPENCV, cv2.dnn.DNN_TARGET_CPU)
+)
+
+#neighbour offsets for the 8 lbp bits, clockwise from the top left
+LBP_NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def ncc_batch(probe, probe_mean, probe_std, refs, ref_means, ref_stds):
+        """normalized cross correlation of one probe against every reference"""
+        n, h, w = refs.shape
+        out = np.empty(n, dtype=np.float32)
+        
+        for i in prange(n):
+            acc = 0.0
+            for r in range(h):
+                for c in range(w):
+                    acc += (probe[r, c] - probe_mean) * (refs[i, r, c] - ref_means[i])
+            
+            #same normalization as TM_CCOEFF_NORMED
+            denom = probe_std * ref_stds[i] * h * w
+            out[i] = acc / denom if denom > 0 else 0.0
+        
+        return out
+
+def normalize_templates(faces, means, stds):
+    """flatten faces into zero mean, unit length rows so a dot product is TM_CCOEFF_NORMED"""
+    n = faces.shape[0]
+    centered = faces.reshape(n, int(np.prod(faces.shape[1:]))) - means.reshape(n, 1)
+    norms = stds.reshape(n, 1) * np.sqrt(centered.shape[1])
+    return np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+
+def lbp_descriptor(face):
+    """local binary pattern codes of a grayscale face, one byte per pixel"""
+    small = cv2.resize(face, LBP_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+    height, width = small.shape
+    center = small[1:-1, 1:-1]
+    codes = np.zeros(center.shape, dtype=np.uint8)
+    
+    #each bit says whether that neighbour is at least as bright as the center
+    for bit, (dy, dx) in enumerate(LBP_NEIGHBOURS):
+        neighbour = small[1+dy:height-1+dy, 1+dx:width-1+dx]
+        codes |= (neighbour >= center).astype(np.uint8) << bit
+    
+    return codes.ravel()
+
+def select_dnn_target(net, input_size):
+    """put a dnn on the fastest backend that can actually run it"""
+    #a backend that isn't built in only fails once the net runs, so warm it up
+    warmup = np.zeros((1, 3, input_size[1], input_size[0]), dtype=np.float32)
+    
+    for name, backend, target in DNN_TARGETS:
+        #opencv quietly falls back to cpu for missing devices, so skip them up front
+        if backend == cv2.dnn.DNN_BACKEND_CUDA and cv2.cuda.getCudaEnabledDeviceCount() == 0:
+            continue
+        if target == cv2.dnn.DNN_TARGET_OPENCL_FP16 and not cv2.ocl.haveOpenCL():
+            continue
+        
+        try:
+            net.setPreferableBackend(backend)
+            net.setPreferableTarget(target)
+            net.setInput(warmup)
+            net.forward()
+            return name
+        except cv2.error:
+            continue
+    
+    raise RuntimeError("no dnn backend could run the network")
+
+def setup_logging():
+    """send log records through a queue so the frame loop never waits on file writes"""
+    SYSTEM_LOG.parent.mkdir(parents=True, exist_ok=True)
+    
+    file_handler = logging.handlers.RotatingFileHandler(
+        SYSTEM_LOG, maxBytes=10 * 1024 * 1024, backupCount=3
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(message)s'))
+    
+    #handlers run on the listener thread, callers only put records on the queue
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    
+    #the queue handler pre-formats records, keep that to the bare message
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler], force=True)
+
+def setup_opencv():
+    """set opencv threads and opencl, and log the parallel framework and jpeg codec it was built with"""
+    cv2.setUseOptimized(True)
+    cv2.setNumThreads(OPENCV_THREADS)
+    cv2.ocl.setUseOpenCL(USE_OPENCL and cv2.ocl.haveOpenCL())
+    
+    #detection only scales across cores if opencv was built with a thread backend,
+    #and snapshot encoding uses simd when it was built against libjpeg-turbo
+    framework, jpeg = 'unknown', 'unknown'
+    for line in cv2.getBuildInformation().splitlines():
+        line = line.strip()
+        if line.startswith('Parallel framework:'):
+            framework = line.split(':', 1)[1].strip()
+        elif line.startswith('JPEG:'):
+            jpeg = line.split(':', 1)[1].strip()
+    
+    logger.info("opencv parallel framework: %s, using %s threads", framework, cv2.getNumThreads())
+    logger.info("opencl %s", "enabled" if cv2.ocl.useOpenCL() else "not available, using cpu")
+    logger.info("opencv jpeg codec: %s", jpeg)
+
 class AttendanceSystem:
+    #sqlite keeps a prepared statement per distinct sql string, so these get compiled once
+    SELECT_STUDENTS_SQL = '''
+        SELECT student_id, first_name, last_name, photo_path 
+        FROM students 
+        WHERE active = TRUE AND photo_path IS NOT NULL
+    '''
+    INSERT_ATTENDANCE_SQL = '''
+        INSERT OR IGNORE INTO attendance (student_id, class_date, check_in_time, status, confidence, photo_path)
+        VALUES (?, ?, ?, ?, ?, ?)
+    '''
+    CLEAR_ATTENDANCE_PHOTO_SQL = 'UPDATE attendance SET photo_path = NULL WHERE id = ?'
+    SELECT_TODAYS_ATTENDANCE_SQL = 'SELECT student_id FROM attendance WHERE class_date = ?'
+    
     def __init__(self):
+        setup_opencv()
         self.face_cascade = None
-        self.reference_faces = {}
+        self.face_net = None
+        self.detector_name = None
+        self.detection_scale = DETECTION_SCALE
+        self.face_embedder = None
+        self.trackers = []
+        self.last_faces = []
+        self.last_recognitions = []
+        self.prev_small = None
+        self.ref_ids = []
+        self.ref_names = []
+        self.ref_keys = []
+        self.ref_rois = None
+        self.ref_coords = None
+        self.ref_matrix = None
+        self.ref_stack = None
+        self.ref_means = None
+        self.ref_stds = None
+        self.ref_templates = None
+        self.ref_lbp = None
         self.camera = None
+        self.capture_thread = None
+        self.capturing = False
+        self.latest_frame = None
+        self.frame_lock = threading.Lock()
+        self.frame_ready = threading.Event()
+        self.save_queue = None
+        self.save_thread = None
+        self.recorded_today = set()
+        self.attendance_date = None
+        self.conn = None
+        self.connect_database()
         self.load_face_detector()
+        self.load_face_embedder()
         self.load_reference_faces()
     
+    def connect_database(self):
+        """open the connection we keep for the whole session"""
+        #autocommit, every write here is a single statement anyway
+        self.conn = sqlite3.connect(
+            STUDENTS_DB, isolation_level=None, check_same_thread=False
+        )
+        for pragma in SQLITE_PRAGMAS:
+            self.conn.execute(f'PRAGMA {pragma}')
+        atexit.register(self.close_database)
+        
+        #older databases were created before the index existed
+        try:
+            self.conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_att_student_date
+                ON attendance (student_id, class_date)
+            ''')
+        except sqlite3.IntegrityError:
+            logger.warning("couldn't add attendance index, remove duplicate attendance rows first")
+    
+    def close_database(self):
+        """close the session connection, safe to call more than once"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+    
     def load_face_detector(self):
         """load opencv face detection model"""
-        try:
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        #prefer the ssd detector, one forward pass instead of a cascade pyramid
+        if FACE_DETECTOR_MODEL.exists() and FACE_DETECTOR_CONFIG.exists():
+            try:
+                self.face_net = cv2.dnn.readNetFromTensorflow(
+                    str(FACE_DETECTOR_MODEL), str(FACE_DETECTOR_CONFIG)
+                )
+                target = select_dnn_target(self.face_net, DETECTOR_INPUT_SIZE)
+                self.detector_name = 'dnn'
+                logger.info("dnn face detector loaded (%s)", target)
+                return
+            except (cv2.error, RuntimeError) as e:
+                logger.warning("error loading dnn face detector, using a cascade: %s", e)
+                self.face_net = None
+        
+        #lbp features are integer compares, a lot cheaper than haar rectangle sums
+        cascades = [('lbp', str(LBP_CASCADE)), ('haar', cv2.data.haarcascades + HAAR_CASCADE)]
+        for name, path in cascades:
+            if not Path(path).exists():
+                continue
+            
+            try:
+                cascade = cv2.CascadeClassifier(path)
+            except cv2.error as e:
+                logger.warning("error loading %s cascade: %s", name, e)
+                continue
+            
+            #an unparseable file gives an empty classifier rather than an error
+            if not cascade.empty():
+                self.face_cascade = cascade
+                self.detector_name = name
+                if name == 'lbp':
+                    self.detection_scale = LBP_DETECTION_SCALE
+                logger.info("%s face detector loaded", name)
+                return
+        
+        logger.error("error loading face detector: no cascade file found")
+    
+    def detect_faces(self, image, scale=None):
+        """find faces in a bgr image, returns a list of (x, y, w, h) boxes"""
+        if self.face_net is None:
+            if scale is None:
+                scale = self.detection_scale
+            is_color = image.ndim == 3
+            
+            #with a umat opencv runs the conversion, resize and cascade through opencl
+            if cv2.ocl.useOpenCL():
+                image = cv2.UMat(image)
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if is_color else image
+            
+            #the cascade cost grows with pixel count, so search a shrunk copy
+            if scale != 1.0:
+                gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            min_size = tuple(int(v * scale) for v in MIN_FACE_SIZE)
+            
+            faces = self.face_cascade.detectMultiScale(
+                gray, scaleFactor=SCALE_FACTOR,
+                minNeighbors=MIN_NEIGHBORS, minSize=min_size
+            )
+            return [tuple(int(v / scale) for v in face) for face in faces]
+        
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(image, 1.0, DETECTOR_INPUT_SIZE, (104, 177, 123))
+        self.face_net.setInput(blob)
+        detections = self.face_net.forward()[0, 0]
+        
+        #rows are [image_id, label, confidence, x1, y1, x2, y2] in relative coords
+        detections = detections[detections[:, 2] > DETECTION_CONFIDENCE]
+        corners = detections[:, 3:7] * [width, height, width, height]
+        corners = np.clip(corners, 0, [width, height, width, height]).astype(int)
+        
+        boxes = []
+        for x1, y1, x2, y2 in corners:
+            if x2 > x1 and y2 > y1:
+                boxes.append((int(x1), int(y1), int(x2 - x1), int(y2 - y1)))
+        return boxes
+    
+    def start_trackers(self, frame, faces):
+        """start a tracker on each detected face to follow it until the next detection"""
+        self.last_faces = list(faces)
+        self.trackers = []
+        
+        #kcf only ships with opencv-contrib, without it we just keep the last boxes
+        create_tracker = getattr(cv2, 'TrackerKCF_create', None)
+        if create_tracker is None:
+            return
+        
+        for face in self.last_faces:
+            tracker = create_tracker()
+            tracker.init(frame, tuple(face))
+            self.trackers.append(tracker)
+    
+    def track_faces(self, frame):
+        """move the last detected boxes along with the faces"""
+        if not self.trackers:
+            return self.last_faces
+        
+        height, width = frame.shape[:2]
+        faces = []
+        for tracker in self.trackers:
+            ok, (x, y, w, h) = tracker.update(frame)
+            if not ok:
+                continue
+            
+            #trackers can drift past the frame edge
+            x1, y1 = max(int(x), 0), max(int(y), 0)
+            x2, y2 = min(int(x + w), width), min(int(y + h), height)
+            if x2 > x1 and y2 > y1:
+                faces.append((x1, y1, x2 - x1, y2 - y1))
+        
+        return faces
+    
+    def frame_has_motion(self, frame):
+        """cheap check on a tiny copy of the frame for whether anything moved"""
+        small = cv2.cvtColor(
+            cv2.resize(frame, MOTION_SIZE, interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+        
+        #compare against the last processed frame so slow drift still adds up
+        if self.prev_small is not None:
+            diff = cv2.absdiff(small, self.prev_small)
+            if np.count_nonzero(diff > MOTION_THRESHOLD) < MOTION_MIN_PIXELS:
+                return False
+        
+        self.prev_small = small
+        return True
+    
+    def load_face_embedder(self):
+        """load the openface embedding network if the model is downloaded"""
+        if not FACE_EMBEDDING_MODEL.exists():
+            logger.warning(
+                "embedding model not found at %s, using template matching", FACE_EMBEDDING_MODEL
             )
-            print("face detector loaded")
+            return
+        
+        try:
+            self.face_embedder = cv2.dnn.readNetFromTorch(str(FACE_EMBEDDING_MODEL))
+            target = select_dnn_target(self.face_embedder, EMBEDDING_INPUT_SIZE)
+            logger.info("face embedder loaded (%s)", target)
+        except (cv2.error, RuntimeError) as e:
+            logger.error("error loading face embedder: %s", e)
+            self.face_embedder = None
+    
+    def compute_embedding(self, face_img):
+        """turn a bgr face crop into a unit length 128-d embedding"""
+        return self.compute_embeddings([face_img])[0]
+    
+    def compute_embeddings(self, face_imgs):
+        """embed a list of bgr face crops in one forward pass, returns (K, 128)"""
+        blob = cv2.dnn.blobFromImages(
+            face_imgs, 1.0 / 255, EMBEDDING_INPUT_SIZE, (0, 0, 0),
+            swapRB=True, crop=False
+        )
+        self.face_embedder.setInput(blob)
+        embeddings = self.face_embedder.forward().reshape(len(face_imgs), -1)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    
+    def load_reference_cache(self):
+        """load cached reference faces, keyed by student id"""
+        if not REFERENCE_CACHE.exists():
+            return {}
+        
+        try:
+            #every data[...] lookup decompresses the whole array, so read each once
+            with np.load(REFERENCE_CACHE) as data:
+                rois = data['rois']
+                coords = data['coords']
+                embeddings = data['embeddings']
+                return {
+                    student_id: {
+                        'key': key,
+                        'face_roi': rois[i],
+                        'face_coords': tuple(int(v) for v in coords[i]),
+                        'embedding': embeddings[i] if embeddings.shape[1] else None
+                    }
+                    for i, (student_id, key) in enumerate(zip(data['ids'], data['keys']))
+                }
         except Exception as e:
-            print(f"error loading face detector: {e}")
+            logger.warning("ignoring unreadable reference cache: %s", e)
+            return {}
+    
+    def reference_cache_key(self, photo_path):
+        """identify a reference photo plus everything that shapes what we extract from it"""
+        stat = os.stat(photo_path)
+        embedder = FACE_EMBEDDING_MODEL.name if self.face_embedder is not None else 'none'
+        template_size = 'x'.join(str(v) for v in TEMPLATE_SIZE)
+        return (
+            f"{photo_path}|{stat.st_mtime_ns}|{stat.st_size}|{self.detector_name}"
+            f"|{template_size}|{embedder}"
+        )
+    
+    def save_reference_cache(self):
+        """write the current reference arrays to the cache file atomically"""
+        if self.ref_matrix is not None:
+            embeddings = self.ref_matrix
+        else:
+            embeddings = np.empty((len(self.ref_ids), 0), dtype=np.float32)
+        
+        REFERENCE_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = REFERENCE_CACHE.with_suffix('.tmp')
+        
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    ids=np.array(self.ref_ids, dtype=str),
+                    keys=np.array(self.ref_keys, dtype=str),
+                    rois=self.ref_rois,
+                    coords=self.ref_coords,
+                    embeddings=embeddings
+                )
+            os.replace(tmp_path, REFERENCE_CACHE)
+        except OSError as e:
+            logger.warning("couldn't write reference cache: %s", e)
+    
+    def extract_reference_face(self, student_id, photo_path):
+        """find the face in a reference photo, returns (face_roi, coords, embedding) or None"""
+        #grayscale is all the cascade needs, the dnn detector and embedder want color
+        if self.face_net is not None or self.face_embedder is not None:
+            reference_img = cv2.imread(photo_path)
+        else:
+            reference_img = cv2.imread(photo_path, cv2.IMREAD_GRAYSCALE)
+        
+        if reference_img is None:
+            logger.warning("couldn't load photo for %s", student_id)
+            return None
+        
+        if reference_img.ndim == 3:
+            gray = cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = reference_img
+        
+        #detect face in reference photo
+        faces = self.detect_faces(
+            reference_img if self.face_net is not None else gray, scale=1.0
+        )
+        
+        if len(faces) == 0:
+            logger.warning("no face found in photo for %s", student_id)
+            return None
+        
+        #use the largest face found
+        largest_face = max(faces, key=lambda x: x[2] * x[3])
+        x, y, w, h = (int(v) for v in largest_face)
+        face_roi = cv2.resize(gray[y:y+h, x:x+w], TEMPLATE_SIZE)
+        
+        #embed once here so recognition is just a dot product
+        embedding = None
+        if self.face_embedder is not None:
+            embedding = self.compute_embedding(reference_img[y:y+h, x:x+w])
+        
+        return face_roi, (x, y, w, h), embedding
     
     def load_reference_faces(self):
         """load all student reference photos"""
-        print("loading student reference photos...")
-        
-        conn = sqlite3.connect(STUDENTS_DB)
-        cursor = conn.cursor()
+        logger.info("loading student reference photos...")
         
-        cursor.execute('''
-            SELECT student_id, first_name, last_name, photo_path 
-            FROM students 
-            WHERE active = TRUE AND photo_path IS NOT NULL
-        ''')
+        students = self.conn.execute(self.SELECT_STUDENTS_SQL).fetchall()
         
-        students = cursor.fetchall()
-        conn.close()
+        cache = self.load_reference_cache()
+        dirty = False
+        ids, names, keys, rois, coords, embeddings = [], [], [], [], [], []
         
         for student in students:
             student_id, first_name, last_name, photo_path = student
             
-            if Path(photo_path).exists():
-                #load and process reference image
-                reference_img = cv2.imread(photo_path)
-                if reference_img is not None:
-                    #convert to grayscale for face detection
-                    gray = cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
-                    
-                    #detect face in reference photo
-                    faces = self.face_cascade.detectMultiScale(
-                        gray, scaleFactor=SCALE_FACTOR, 
-                        minNeighbors=MIN_NEIGHBORS, minSize=MIN_FACE_SIZE
-                    )
-                    
-                    if len(faces) > 0:
-                        #use the largest face found
-                        largest_face = max(faces, key=lambda x: x[2] * x[3])
-                        x, y, w, h = largest_face
-                        face_roi = gray[y:y+h, x:x+w]
-                        
-                        #store the face data
-                        self.reference_faces[student_id] = {
-                            'name': f"{first_name} {last_name}",
-                            'face_roi': face_roi,
-                            'face_coords': (x, y, w, h)
-                        }
-                        
-                        print(f"loaded reference for {first_name} {last_name}")
-                    else:
-                        print(f"no face found in photo for {student_id}")
-                else:
-                    print(f"couldn't load photo for {student_id}")
+            if not Path(photo_path).exists():
+                logger.warning("photo not found for %s: %s", student_id, photo_path)
+                continue
+            
+            #redo the photo if it or the way we process it changed
+            key = self.reference_cache_key(photo_path)
+            cached = cache.get(student_id)
+            
+            if cached is not None and cached['key'] == key:
+                face_roi, face_coords = cached['face_roi'], cached['face_coords']
+                embedding = cached['embedding']
             else:
-                print(f"photo not found for {student_id}: {photo_path}")
+                dirty = True
+                extracted = self.extract_reference_face(student_id, photo_path)
+                if extracted is None:
+                    continue
+                face_roi, face_coords, embedding = extracted
+            
+            #one entry per student in each parallel list
+            ids.append(student_id)
+            names.append(f"{first_name} {last_name}")
+            keys.append(key)
+            rois.append(face_roi)
+            coords.append(face_coords)
+            embeddings.append(embedding)
+            
+            logger.info("loaded reference for %s %s", first_name, last_name)
         
-        print(f"loaded {len(self.reference_faces)} reference faces")
-    
-    def compare_faces(self, face1, face2):
-        """simple face comparison using template matching"""
-        #resize faces to same size for comparison
-        size = (100, 100)
-        face1_resized = cv2.resize(face1, size)
-        face2_resized = cv2.resize(face2, size)
+        #contiguous arrays so matching is vectorized instead of a loop over students
+        self.ref_ids = ids
+        self.ref_names = names
+        self.ref_keys = keys
+        self.ref_rois = np.array(rois, dtype=np.uint8).reshape(-1, *TEMPLATE_SIZE[::-1])
+        self.ref_coords = np.array(coords, dtype=np.int32).reshape(-1, 4)
+        
+        if ids and self.face_embedder is not None:
+            self.ref_matrix = np.stack(embeddings).astype(np.float32)
+        else:
+            self.ref_matrix = None
         
-        #use template matching
-        result = cv2.matchTemplate(face1_resized, face2_resized, cv2.TM_CCOEFF_NORMED)
-        confidence = result[0][0]
+        #only build the template arrays the active matcher reads
+        self.ref_stack = self.ref_means = self.ref_stds = None
+        self.ref_templates = self.ref_lbp = None
         
-        return confidence
+        if self.ref_matrix is None and TEMPLATE_MATCHER == 'lbp':
+            self.ref_lbp = np.array(
+                [lbp_descriptor(roi) for roi in self.ref_rois], dtype=np.uint8
+            ).reshape(len(ids), (LBP_SIZE[0] - 2) * (LBP_SIZE[1] - 2))
+        elif self.ref_matrix is None:
+            stack = self.ref_rois.astype(np.float32)
+            means = stack.mean(axis=(1, 2))
+            stds = stack.std(axis=(1, 2))
+            if HAVE_NUMBA:
+                self.ref_stack, self.ref_means, self.ref_stds = stack, means, stds
+            else:
+                self.ref_templates = normalize_templates(stack, means, stds)
+        
+        if dirty or set(cache) != set(ids):
+            self.save_reference_cache()
+        
+        #cached matches are indices into the old arrays, drop them with the arrays
+        self.last_faces = []
+        self.last_recognitions = []
+        self.trackers = []
+        self.prev_small = None
+        
+        logger.info("loaded %s reference faces", len(self.ref_ids))
     
-    def recognize_face(self, face_roi):
-        """try to recognize a face against reference photos"""
-        best_match = None
-        best_confidence = 0.0
+    def recognize_face(self, face_img):
+        """try to recognize a bgr face crop, returns (reference index or None, confidence)"""
+        if not self.ref_ids:
+            return None, 0.0
         
-        for student_id, ref_data in self.reference_faces.items():
-            confidence = self.compare_faces(face_roi, ref_data['face_roi'])
+        if self.ref_matrix is not None:
+            #cosine similarity against every reference in one go
+            probe = self.compute_embedding(face_img)
+            sims = self.ref_matrix @ probe
+            i = int(sims.argmax())
+            best_confidence = float(sims[i])
             
-            if confidence > best_confidence:
-                best_confidence = confidence
-                best_match = student_id
+            if best_confidence > EMBEDDING_THRESHOLD:
+                return i, best_confidence
+            return None, best_confidence
         
-        #set threshold for recognition
-        threshold = 0.6  #adjust this based on testing
+        #no embedder, fall back to template matching
+        #references are stored at TEMPLATE_SIZE so only the probe gets resized, once
+        probe_roi = cv2.cvtColor(cv2.resize(face_img, TEMPLATE_SIZE), cv2.COLOR_BGR2GRAY)
         
-        if best_confidence > threshold:
-            return best_match, best_confidence
-        else:
+        if TEMPLATE_MATCHER == 'lbp':
+            #hamming distance between binary patterns, robust to lighting changes
+            probe_lbp = lbp_descriptor(probe_roi)
+            diff_bits = np.unpackbits(np.bitwise_xor(self.ref_lbp, probe_lbp), axis=1)
+            sims = 1.0 - diff_bits.sum(axis=1) / diff_bits.shape[1]
+            
+            i = int(sims.argmax())
+            best_confidence = float(sims[i])
+            
+            if best_confidence > LBP_THRESHOLD:
+                return i, best_confidence
             return None, best_confidence
+        
+        probe = probe_roi.astype(np.float32)
+        probe_mean, probe_std = probe.mean(), probe.std()
+        
+        if HAVE_NUMBA:
+            #score every reference in one parallel jit call
+            sims = ncc_batch(
+                probe, probe_mean, probe_std,
+                self.ref_stack, self.ref_means, self.ref_stds
+            )
+        else:
+            #same scores as a matrix-vector product over the normalized references
+            probe_row = normalize_templates(
+                probe[np.newaxis], np.array([probe_mean]), np.array([probe_std])
+            )[0]
+            sims = self.ref_templates @ probe_row
+        
+        i = int(sims.argmax())
+        best_confidence = float(sims[i])
+        
+        if best_confidence > TEMPLATE_THRESHOLD:
+            return i, best_confidence
+        return None, best_confidence
     
-    def record_attendance(self, student_id, confidence):
-        """record attendance in database"""
-        conn = sqlite3.connect(STUDENTS_DB)
-        cursor = conn.cursor()
+    def recognize_faces(self, frame, faces):
+        """recognize every face box in a frame, returns (reference index or None, confidence) per box"""
+        if self.ref_matrix is None or not faces:
+            return [self.recognize_face(frame[y:y+h, x:x+w]) for (x, y, w, h) in faces]
+        
+        #one batched forward pass and one (K, 128) @ (128, N) product for all faces
+        face_imgs = [frame[y:y+h, x:x+w] for (x, y, w, h) in faces]
+        sims = self.compute_embeddings(face_imgs) @ self.ref_matrix.T
         
+        results = []
+        for row in sims:
+            i = int(row.argmax())
+            confidence = float(row[i])
+            results.append((i if confidence > EMBEDDING_THRESHOLD else None, confidence))
+        return results
+    
+    def record_attendance(self, student_id, confidence, name=None, frame=None):
+        """record attendance in database, saving a snapshot of frame if given"""
         today = date.today()
         now = datetime.now()
         
-        #check if already recorded today
-        cursor.execute('''
-            SELECT id FROM attendance 
-            WHERE student_id = ? AND class_date = ?
-        ''', (student_id, today))
-        
-        if cursor.fetchone():
-            print(f"attendance already recorded for {student_id} today")
-            conn.close()
-            return False
+        photo_path = None
+        if frame is not None and self.save_queue is not None:
+            photo_path = CAPTURED_DIR / f"{student_id}_{now:%Y%m%d_%H%M%S}{CAPTURE_FORMAT}"
         
-        #record new attendance
+        #the unique index on (student_id, class_date) does the duplicate check
         try:
-            cursor.execute('''
-                INSERT INTO attendance (student_id, class_date, check_in_time, status, confidence)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (student_id, today, now, 'present', confidence))
-            
-            conn.commit()
-            
-            #get student name
-            cursor.execute('''
-                SELECT first_name, last_name FROM students WHERE student_id = ?
-            ''', (student_id,))
-            
-            student = cursor.fetchone()
-            name = f"{student[0]} {student[1]}" if student else student_id
-            
-            print(f"attendance recorded: {name} ({student_id}) - confidence: {confidence:.2f}")
-            return True
-            
+            cursor = self.conn.execute(
+                self.INSERT_ATTENDANCE_SQL,
+                (student_id, today, now, 'present', confidence,
+                 str(photo_path) if photo_path else None)
+            )
         except Exception as e:
-            print(f"error recording attendance: {e}")
+            logger.error("error recording attendance: %s", e)
             return False
-        finally:
-            conn.close()
+        
+        self.recorded_today.add(student_id)
+        
+        if cursor.rowcount == 0:
+            logger.debug("attendance already recorded for %s today", student_id)
+            return False
+        
+        #snapshots aren't critical, drop this one rather than wait on the writer
+        if photo_path is not None:
+            try:
+                self.save_queue.put_nowait((photo_path, frame))
+            except queue.Full:
+                logger.warning("snapshot queue full, not saving photo for %s", student_id)
+                self.conn.execute(self.CLEAR_ATTENDANCE_PHOTO_SQL, (cursor.lastrowid,))
+        
+        logger.info(
+            "attendance recorded: %s (%s) - confidence: %.2f",
+            name or student_id, student_id, confidence
+        )
+        return True
+    
+    def load_todays_attendance(self):
+        """remember who is already checked in so we don't hit the db every frame"""
+        today = date.today()
+        cursor = self.conn.execute(self.SELECT_TODAYS_ATTENDANCE_SQL, (today,))
+        self.recorded_today = {row[0] for row in cursor.fetchall()}
+        self.attendance_date = today
     
     def start_camera(self):
         """start the camera for live attendance"""
         self.camera = cv2.VideoCapture(CAMERA_INDEX)
         
         if not self.camera.isOpened():
-            print(f"error: couldn't open camera {CAMERA_INDEX}")
+            logger.error("couldn't open camera %s", CAMERA_INDEX)
             return False
         
         self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_WIDTH)
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_HEIGHT)
+        #only ever hand out the newest frame, not one the driver queued earlier
+        self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        self.load_todays_attendance()
         
-        print("camera started - looking for faces...")
-        print("press 'q' to quit, 'r' to reload references")
+        #read frames on their own thread so capture overlaps with recognition
+        self.capturing = True
+        self.capture_thread = threading.Thread(target=self.grab_frames, daemon=True)
+        self.capture_thread.start()
+        
+        #jpeg encoding happens on another thread so check-ins never stall the loop
+        if SAVE_ATTENDANCE_PHOTOS:
+            CAPTURED_DIR.mkdir(parents=True, exist_ok=True)
+            self.save_queue = queue.Queue(maxsize=SAVE_QUEUE_SIZE)
+            self.save_thread = threading.Thread(target=self.save_snapshots, daemon=True)
+            self.save_thread.start()
+        
+        logger.info("camera started - looking for faces...")
+        logger.info("press 'q' to quit, 'r' to reload references")
         return True
     
+    def grab_frames(self):
+        """keep reading the camera, replacing whatever frame hasn't been used yet"""
+        try:
+            while self.capturing:
+                ret, frame = self.camera.read()
+                
+                if not ret:
+                    logger.error("error reading from camera")
+                    self.capturing = False
+                    self.frame_ready.set()
+                    break
+                
+                with self.frame_lock:
+                    self.latest_frame = frame
+                    self.frame_ready.set()
+        finally:
+            #released here so it can never happen in the middle of a read
+            self.camera.release()
+    
+    def next_frame(self):
+        """wait for a frame we haven't processed yet, None once capture stops"""
+        while self.capturing:
+            if not self.frame_ready.wait(timeout=1.0):
+                continue
+            
+            with self.frame_lock:
+                frame = self.latest_frame
+                self.latest_frame = None
+                self.frame_ready.clear()
+            
+            if frame is not None:
+                return frame
+        
+        return None
+    
+    def save_snapshots(self):
+        """write queued attendance snapshots to disk until told to stop"""
+        params = [cv2.IMWRITE_JPEG_QUALITY, CAPTURE_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+        
+        while True:
+            item = self.save_queue.get()
+            if item is None:
+                break
+            
+            path, frame = item
+            if not cv2.imwrite(str(path), frame, params):
+                logger.error("couldn't save snapshot %s", path)
+    
+    def stop_camera(self):
+        """stop the capture thread, which releases the camera on its way out"""
+        self.capturing = False
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=1.0)
+            if self.capture_thread.is_alive():
+                logger.warning("camera read still blocked, it will be released when the read returns")
+            self.capture_thread = None
+        
+        #let queued snapshots finish writing
+        if self.save_thread is not None:
+            self.save_queue.put(None)
+            self.save_thread.join()
+            self.save_thread = None
+            self.save_queue = None
+    
     def run_attendance(self):
         """main attendance loop"""
         if not self.start_camera():
             return
         
+        frame_count = 0
+        
         while True:
-            ret, frame = self.camera.read()
+            frame = self.next_frame()
             
-            if not ret:
-                print("error reading from camera")
+            if frame is None:
                 break
             
-            #convert to grayscale for face detection
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            #new day, nobody is checked in yet
+            if date.today() != self.attendance_date:
+                self.load_todays_attendance()
             
-            #detect faces
-            faces = self.face_cascade.detectMultiScale(
-                gray, scaleFactor=SCALE_FACTOR,
-                minNeighbors=MIN_NEIGHBORS, minSize=MIN_FACE_SIZE
-            )
+            #nothing moved, so the same faces are still there
+            if self.frame_has_motion(frame):
+                #full detection every few frames, cheap tracking in between
+                if frame_count % DETECT_EVERY_N_FRAMES == 0:
+                    faces = self.detect_faces(frame)
+                    self.start_trackers(frame, faces)
+                    self.last_recognitions = self.recognize_faces(frame, faces)
+                elif self.trackers:
+                    faces = self.track_faces(frame)
+                    self.last_recognitions = self.recognize_faces(frame, faces)
+                else:
+                    #no tracker to move the boxes, so the last matches still apply
+                    faces = self.last_faces
+                frame_count += 1
+                
+                self.last_faces = faces
+            
+            faces = self.last_faces
+            
+            #unannotated copy for check-in snapshots, only when someone new is in view
+            snapshot = None
+            if self.save_queue is not None and any(
+                ref_index is not None and self.ref_ids[ref_index] not in self.recorded_today
+                for ref_index, _ in self.last_recognitions
+            ):
+                snapshot = frame.copy()
             
             #process each detected face
-            for (x, y, w, h) in faces:
-                face_roi = gray[y:y+h, x:x+w]
-                
-                #try to recognize the face
-                student_id, confidence = self.recognize_face(face_roi)
-                
-                if student_id:
+            for (x, y, w, h), (ref_index, confidence) in zip(faces, self.last_recognitions):
+                if ref_index is not None:
                     #recognized student
-                    name = self.reference_faces[student_id]['name']
+                    student_id = self.ref_ids[ref_index]
+                    name = self.ref_names[ref_index]
                     color = (0, 255, 0)  #green for recognized
                     label = f"{name} ({confidence:.2f})"
                     
-                    #record attendance
-                    self.record_attendance(student_id, confidence)
+                    #record attendance, skipping students already in today
+                    if student_id not in self.recorded_today:
+                        self.record_attendance(student_id, confidence, name, snapshot)
                 else:
                     #unknown face
                     color = (0, 0, 255)  #red for unknown
@@ -233,7 +853,7 @@ class AttendanceSystem:
             cv2.putText(frame, f"faces detected: {len(faces)}", (10, 30),
                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
             
-            cv2.putText(frame, f"references loaded: {len(self.reference_faces)}", (10, 60),
+            cv2.putText(frame, f"references loaded: {len(self.ref_ids)}", (10, 60),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
             
             #show the frame
@@ -244,25 +864,28 @@ class AttendanceSystem:
             if key == ord('q'):
                 break
             elif key == ord('r'):
-                print("reloading reference faces...")
+                logger.info("reloading reference faces...")
                 self.load_reference_faces()
+                #the reload dropped the old matches, detect again on the next frame
+                frame_count = 0
         
         #cleanup
-        self.camera.release()
+        self.stop_camera()
         cv2.destroyAllWindows()
-        print("attendance system stopped")
+        logger.info("attendance system stopped")
 
 def main():
     """start the attendance system"""
-    print("=== facial recognition attendance system ===")
+    setup_logging()
+    logger.info("=== facial recognition attendance system ===")
     
     system = AttendanceSystem()
     
-    if len(system.reference_faces) == 0:
-        print("no reference faces loaded! add student photos first.")
+    if len(system.ref_ids) == 0:
+        logger.warning("no reference faces loaded! add student photos first.")
         return
     
-    print(f"system ready with {len(system.reference_faces)} students")
+    logger.info("system ready with %s students", len(system.ref_ids))
     input("press enter to start attendance recognition...")
     
     system.run_attendance()
@@ -18,6 +18,8 @@ CAPTURED_DIR = STUDENT_PHOTOS_DIR / 'captured'
 TEMP_DIR = CAPTURED_DIR / 'temp'
 DATABASE_DIR = DATA_DIR / 'databases'
 LOGS_DIR = DATA_DIR / 'logs'
+MODELS_DIR = DATA_DIR / 'models'
+CACHE_DIR = DATA_DIR / 'cache'
 
 #web stuff
 WEB_DIR = BASE_DIR / 'web'
@@ -29,6 +31,11 @@ SRC_DIR = BASE_DIR / 'src'
 STUDENTS_DB = DATABASE_DIR / 'students.db'
 ATTENDANCE_DB = DATABASE_DIR / 'attendance.db'
 DATABASE_URL = f'sqlite:///{STUDENTS_DB}'
+SQLITE_PRAGMAS = (  #run on every connection, wal lets reads and writes overlap
+    'journal_mode=WAL',
+    'synchronous=NORMAL',
+    'temp_store=MEMORY'
+)
 
 #camera settings
 CAMERA_INDEX = 0  #usually 0 for built-in webcam
@@ -37,16 +44,41 @@ FRAME_HEIGHT = 480
 FPS = 30
 CAPTURE_FORMAT = '.jpg'
 CAPTURE_QUALITY = 95  #jpeg quality 0-100
+SAVE_ATTENDANCE_PHOTOS = False  #keep a snapshot of the frame each time someone checks in
+SAVE_QUEUE_SIZE = 4  #snapshots waiting to be written, extras get dropped
 
 #face detection settings
 SCALE_FACTOR = 1.1  #detection sensitivity
 MIN_NEIGHBORS = 5   #how many neighbors needed
 MIN_FACE_SIZE = (30, 30)  #minimum face size
 MAX_FACE_SIZE = ()  #no limit
+OPENCV_THREADS = os.cpu_count() or 1  #threads opencv splits detection across
+USE_OPENCL = True  #run cascade detection on the gpu through opencl when there is one
+FACE_DETECTOR_MODEL = MODELS_DIR / 'opencv_face_detector_uint8.pb'  #ssd face detector weights
+FACE_DETECTOR_CONFIG = MODELS_DIR / 'opencv_face_detector.pbtxt'
+DETECTOR_INPUT_SIZE = (300, 300)  #what the ssd detector expects
+DETECTION_CONFIDENCE = 0.5  #minimum ssd score to count as a face
+LBP_CASCADE = MODELS_DIR / 'lbpcascade_frontalface_improved.xml'  #faster than haar, from opencv/data/lbpcascades
+HAAR_CASCADE = 'haarcascade_frontalface_default.xml'  #fallback that ships with opencv-python
+DETECTION_SCALE = 0.5  #cascade runs on a frame shrunk by this much
+LBP_DETECTION_SCALE = 1.0  #lbp window is 45px vs haar's 24, shrinking would miss faces under 90px
+DETECT_EVERY_N_FRAMES = 3  #track faces in between full detections
+MOTION_SIZE = (80, 60)  #frames get shrunk to this to check for movement
+MOTION_THRESHOLD = 15  #pixel change that counts as movement
+MOTION_MIN_PIXELS = 50  #below this many changed pixels we reuse the last results
 
 #face recognition (for later when we add it)
 FACE_TOLERANCE = 0.6  #lower = stricter
 FACE_MODEL = 'hog'    #hog for cpu, cnn for gpu
+FACE_EMBEDDING_MODEL = MODELS_DIR / 'openface_nn4.small2.v1.t7'  #openface 128-d embedder
+EMBEDDING_INPUT_SIZE = (96, 96)  #what the openface net expects
+EMBEDDING_THRESHOLD = 0.5  #cosine similarity needed for a match, higher = stricter
+TEMPLATE_THRESHOLD = 0.6  #template matching score needed when no embedder
+TEMPLATE_SIZE = (100, 100)  #faces get resized to this before template matching
+REFERENCE_CACHE = CACHE_DIR / 'refs.npz'  #extracted reference faces, rebuilt when photos change
+TEMPLATE_MATCHER = 'ncc'  #ncc for pixel correlation, lbp for faster but much weaker bit matching
+LBP_SIZE = (34, 34)  #faces get shrunk to this before computing lbp codes
+LBP_THRESHOLD = 0.6  #fraction of matching lbp bits needed, unrelated faces land around 0.55
 
 #attendance stuff
 TIMEZONE = 'US/Pacific'  #change this to your timezone
@@ -75,7 +107,6 @@ PERMANENT_SESSION_LIFETIME = 7200  #2 hours
 
 #logging
 SYSTEM_LOG = LOGS_DIR / 'system.log'
-ATTENDANCE_LOG = LOGS_DIR / f'attendance_{datetime.now().strftime("%Y-%m-%d")}.log'
 LOG_LEVEL = 'INFO'
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -100,8 +131,8 @@ def create_directories():
     """make all the folders we need"""
     directories = [
         DATA_DIR, STUDENT_PHOTOS_DIR, REFERENCE_IDS_DIR, 
-        CAPTURED_DIR, TEMP_DIR, DATABASE_DIR, LOGS_DIR,
-        STATIC_DIR, TEMPLATES_DIR
+        CAPTURED_DIR, TEMP_DIR, DATABASE_DIR, LOGS_DIR, MODELS_DIR,
+        CACHE_DIR, STATIC_DIR, TEMPLATES_DIR
     ]
     
     for directory in directories:
@@ -127,7 +158,7 @@ def validate_config():
     print("config looks good")
 
 def get_daily_log_file():
-    """get today's log file"""
+    """get today's log file, worked out per call so it rolls over at midnight"""
     return LOGS_DIR / f'attendance_{datetime.now().strftime("%Y-%m-%d")}.log'
 
 def is_image_file(filename):
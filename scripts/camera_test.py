@@ -10,7 +10,7 @@ import numpy as np
 
 #add parent directory to path so we can import config
 sys.path.append(str(Path(__file__).parent.parent))
-from config import CAMERA_INDEX, FRAME_WIDTH, FRAME_HEIGHT
+from config import CAMERA_INDEX, FRAME_WIDTH, FRAME_HEIGHT, LBP_CASCADE, HAAR_CASCADE
 
 def test_camera():
     """test if camera works"""
@@ -60,9 +60,15 @@ def test_face_detection():
     """test face detection with camera"""
     print("testing face detection...")
     
-    #load face detection model
+    #load face detection model, lbp if downloaded since it's faster than haar
     try:
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        if LBP_CASCADE.exists():
+            face_cascade = cv2.CascadeClassifier(str(LBP_CASCADE))
+        else:
+            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + HAAR_CASCADE)
+        if face_cascade.empty():
+            print("error loading face detection: no cascade file found")
+            return False
         print("face detection model loaded")
     except Exception as e:
         print(f"error loading face detection: {e}")
@@ -11,13 +11,20 @@ from datetime import datetime, date
 
 #add parent directory to path so we can import config
 sys.path.append(str(Path(__file__).parent.parent))
-from config import STUDENTS_DB, ATTENDANCE_DB
+from config import STUDENTS_DB, ATTENDANCE_DB, SQLITE_PRAGMAS
+
+def get_connection():
+    """open the database with our pragmas applied"""
+    conn = sqlite3.connect(STUDENTS_DB)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(f'PRAGMA {pragma}')
+    return conn
 
 def create_students_table():
     """create the students table"""
     print("creating students table...")
     
-    conn = sqlite3.connect(STUDENTS_DB)
+    conn = get_connection()
     cursor = conn.cursor()
     
     #create students table
@@ -43,7 +50,7 @@ def create_attendance_table():
     """create the attendance table in the same database"""
     print("creating attendance table...")
     
-    conn = sqlite3.connect(STUDENTS_DB)  #use same database
+    conn = get_connection()  #use same database
     cursor = conn.cursor()
     
     #create attendance table
@@ -61,6 +68,15 @@ def create_attendance_table():
         )
     ''')
     
+    #one record per student per day, also makes the duplicate check an index lookup
+    try:
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_att_student_date
+            ON attendance (student_id, class_date)
+        ''')
+    except sqlite3.IntegrityError:
+        print("couldn't add attendance index, remove duplicate attendance rows first")
+    
     #create classes table for future use
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS classes (
@@ -80,7 +96,7 @@ def create_attendance_table():
 
 def add_student(student_id, first_name, last_name, email=None, photo_path=None):
     """add a new student"""
-    conn = sqlite3.connect(STUDENTS_DB)
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
@@ -104,7 +120,7 @@ def add_student(student_id, first_name, last_name, email=None, photo_path=None):
 
 def list_students():
     """show all students"""
-    conn = sqlite3.connect(STUDENTS_DB)
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM students WHERE active = TRUE')
@@ -123,7 +139,7 @@ def list_students():
 
 def record_attendance(student_id, status='present', confidence=None):
     """record attendance for a student"""
-    conn = sqlite3.connect(STUDENTS_DB)  #use same database
+    conn = get_connection()  #use same database
     cursor = conn.cursor()
     
     today = date.today()
@@ -139,6 +155,9 @@ def record_attendance(student_id, status='present', confidence=None):
         print(f"recorded attendance for {student_id}: {status}")
         return True
         
+    except sqlite3.IntegrityError:
+        print(f"attendance already recorded for {student_id} today")
+        return False
     except Exception as e:
         print(f"error recording attendance: {e}")
         return False
@@ -147,7 +166,7 @@ def record_attendance(student_id, status='present', confidence=None):
 
 def get_todays_attendance():
     """show today's attendance"""
-    conn = sqlite3.connect(STUDENTS_DB)  #use same database
+    conn = get_connection()  #use same database
     cursor = conn.cursor()
     
     today = date.today()
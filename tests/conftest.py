@@ -0,0 +1,82 @@
+"""
+shared fixtures, every test gets its own database and reference cache
+"""
+
+import sqlite3
+
+import cv2
+import numpy as np
+import pytest
+
+import attendance_system
+from attendance_system import AttendanceSystem
+from scripts import database_setup
+
+class CountingCascade:
+    """stands in for the cascade, always finds the same face and counts calls"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def detectMultiScale(self, image, **kwargs):
+        self.calls += 1
+        return np.array([[10, 20, 100, 120]])
+
+@pytest.fixture
+def students_db(tmp_path, monkeypatch):
+    """empty students/attendance database in a temp dir"""
+    db_path = tmp_path / 'students.db'
+    monkeypatch.setattr(database_setup, 'STUDENTS_DB', db_path)
+    monkeypatch.setattr(attendance_system, 'STUDENTS_DB', db_path)
+    monkeypatch.setattr(attendance_system, 'REFERENCE_CACHE', tmp_path / 'cache' / 'refs.npz')
+    
+    database_setup.create_students_table()
+    database_setup.create_attendance_table()
+    return db_path
+
+@pytest.fixture
+def photos(students_db, tmp_path):
+    """two students with random reference photos"""
+    paths = []
+    for i in range(2):
+        photo_path = tmp_path / f'student_{i}.png'
+        image = np.random.default_rng(i).integers(0, 256, (200, 200, 3), dtype=np.uint8)
+        cv2.imwrite(str(photo_path), image)
+        database_setup.add_student(f'student_{i}', 'test', str(i), photo_path=str(photo_path))
+        paths.append(photo_path)
+    return paths
+
+@pytest.fixture
+def system(photos):
+    """attendance system using the fake cascade and plain template matching"""
+    system = AttendanceSystem()
+    system.face_net = None
+    system.face_embedder = None
+    system.face_cascade = CountingCascade()
+    system.detector_name = 'lbp'
+    system.load_reference_faces()
+    yield system
+    system.close_database()
+
+@pytest.fixture
+def db_system(students_db):
+    """just the database side of the attendance system"""
+    system = AttendanceSystem.__new__(AttendanceSystem)
+    system.save_queue = None
+    system.recorded_today = set()
+    system.connect_database()
+    yield system
+    system.close_database()
+
+@pytest.fixture
+def count_attendance(students_db):
+    """counts the attendance rows stored for a student"""
+    def count(student_id):
+        conn = sqlite3.connect(students_db)
+        try:
+            return conn.execute(
+                'SELECT COUNT(*) FROM attendance WHERE student_id = ?', (student_id,)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+    return count
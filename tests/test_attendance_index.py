@@ -0,0 +1,49 @@
+"""
+the unique index keeps attendance to one row per student per day
+"""
+
+import sqlite3
+
+import pytest
+
+from scripts import database_setup
+
+@pytest.fixture
+def legacy_db(students_db):
+    """a database created before the attendance index existed"""
+    conn = sqlite3.connect(students_db)
+    conn.execute('DROP INDEX idx_att_student_date')
+    conn.close()
+    return students_db
+
+def test_unique_index_exists(students_db):
+    conn = sqlite3.connect(students_db)
+    indexes = [row[1] for row in conn.execute('PRAGMA index_list(attendance)')]
+    conn.close()
+    assert 'idx_att_student_date' in indexes
+
+def test_second_check_in_is_ignored(db_system, count_attendance):
+    assert db_system.record_attendance('student_001', 0.9) is True
+    assert db_system.record_attendance('student_001', 0.95) is False
+    
+    assert count_attendance('student_001') == 1
+
+def test_students_are_counted_separately(db_system, count_attendance):
+    assert db_system.record_attendance('student_001', 0.9) is True
+    assert db_system.record_attendance('student_002', 0.9) is True
+    
+    assert count_attendance('student_001') == 1
+    assert count_attendance('student_002') == 1
+
+def test_setup_script_rejects_duplicates(students_db, count_attendance):
+    assert database_setup.record_attendance('student_001') is True
+    assert database_setup.record_attendance('student_001') is False
+    
+    assert count_attendance('student_001') == 1
+
+def test_index_is_added_to_an_existing_database(legacy_db, db_system, count_attendance):
+    #db_system connects after legacy_db dropped the index, so connecting has to add it back
+    db_system.record_attendance('student_001', 0.9)
+    db_system.record_attendance('student_001', 0.9)
+    
+    assert count_attendance('student_001') == 1
@@ -0,0 +1,56 @@
+"""
+the template matchers have to score exactly like cv2.matchTemplate
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+import attendance_system
+from attendance_system import normalize_templates
+
+def make_faces(n, size=(40, 30), seed=0):
+    """random grayscale faces as float32, shape (n, h, w)"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (n, *size)).astype(np.float32)
+
+def opencv_scores(probe, refs):
+    """reference scores from TM_CCOEFF_NORMED, same size so each result is 1x1"""
+    return np.array([
+        cv2.matchTemplate(ref, probe, cv2.TM_CCOEFF_NORMED)[0, 0] for ref in refs
+    ])
+
+def test_normalize_templates_matches_opencv():
+    refs = make_faces(5)
+    probe = make_faces(1, seed=1)[0]
+    
+    templates = normalize_templates(refs, refs.mean(axis=(1, 2)), refs.std(axis=(1, 2)))
+    probe_row = normalize_templates(
+        probe[np.newaxis], np.array([probe.mean()]), np.array([probe.std()])
+    )[0]
+    
+    np.testing.assert_allclose(templates @ probe_row, opencv_scores(probe, refs), atol=1e-4)
+
+def test_normalize_templates_identical_face_scores_one():
+    refs = make_faces(3)
+    templates = normalize_templates(refs, refs.mean(axis=(1, 2)), refs.std(axis=(1, 2)))
+    np.testing.assert_allclose(templates @ templates[1], opencv_scores(refs[1], refs), atol=1e-4)
+    assert templates[1] @ templates[1] == pytest.approx(1.0, abs=1e-4)
+
+def test_normalize_templates_flat_face_scores_zero():
+    #a blank crop has no variance, it shouldn't divide by zero
+    refs = np.full((2, 40, 30), 128, dtype=np.float32)
+    templates = normalize_templates(refs, refs.mean(axis=(1, 2)), refs.std(axis=(1, 2)))
+    assert not templates.any()
+
+@pytest.mark.skipif(not attendance_system.HAVE_NUMBA, reason="numba not installed")
+def test_ncc_batch_matches_opencv():
+    refs = make_faces(5)
+    probe = make_faces(1, seed=1)[0]
+    
+    scores = attendance_system.ncc_batch(
+        probe, probe.mean(), probe.std(),
+        refs, refs.mean(axis=(1, 2)), refs.std(axis=(1, 2))
+    )
+    
+    np.testing.assert_allclose(scores, opencv_scores(probe, refs), atol=1e-4)
@@ -0,0 +1,28 @@
+"""
+students checked in today are remembered so the loop can skip the database
+"""
+
+from datetime import date
+
+def test_check_in_is_remembered(db_system):
+    db_system.record_attendance('student_001', 0.9)
+    
+    assert db_system.recorded_today == {'student_001'}
+
+def test_repeat_check_in_stays_remembered(db_system, count_attendance):
+    db_system.record_attendance('student_001', 0.9)
+    db_system.recorded_today = set()
+    
+    #already in the table, the insert is ignored but the cache still learns it
+    assert db_system.record_attendance('student_001', 0.9) is False
+    assert db_system.recorded_today == {'student_001'}
+    assert count_attendance('student_001') == 1
+
+def test_load_todays_attendance(db_system):
+    db_system.record_attendance('student_001', 0.9)
+    db_system.recorded_today = set()
+    
+    db_system.load_todays_attendance()
+    
+    assert db_system.recorded_today == {'student_001'}
+    assert db_system.attendance_date == date.today()
@@ -0,0 +1,39 @@
+"""
+references are kept as parallel arrays indexed by position
+"""
+
+import pytest
+
+import attendance_system
+
+def test_ids_and_arrays_line_up(system):
+    assert system.ref_ids == ['student_0', 'student_1']
+    assert system.ref_names == ['test 0', 'test 1']
+    assert system.ref_rois.shape == (2, *attendance_system.TEMPLATE_SIZE[::-1])
+    assert system.ref_coords.shape == (2, 4)
+
+@pytest.mark.parametrize('matcher, numba, built', [
+    ('ncc', True, {'ref_stack', 'ref_means', 'ref_stds'}),
+    ('ncc', False, {'ref_templates'}),
+    ('lbp', False, {'ref_lbp'}),
+])
+def test_only_the_active_matcher_arrays_are_built(system, monkeypatch, matcher, numba, built):
+    monkeypatch.setattr(attendance_system, 'TEMPLATE_MATCHER', matcher)
+    monkeypatch.setattr(attendance_system, 'HAVE_NUMBA', numba)
+    
+    system.load_reference_faces()
+    
+    arrays = {'ref_stack', 'ref_means', 'ref_stds', 'ref_templates', 'ref_lbp'}
+    assert {name for name in arrays if getattr(system, name) is not None} == built
+
+def test_reload_drops_cached_matches(system):
+    system.last_faces = [(10, 20, 100, 120)]
+    system.last_recognitions = [(1, 0.9)]
+    system.trackers = [object()]
+    
+    system.load_reference_faces()
+    
+    assert system.last_faces == []
+    assert system.last_recognitions == []
+    assert system.trackers == []
+    assert system.prev_small is None
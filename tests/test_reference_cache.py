@@ -0,0 +1,50 @@
+"""
+the reference cache is reused until a photo or the detector changes
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+import attendance_system
+
+def test_cache_is_written(system):
+    assert attendance_system.REFERENCE_CACHE.exists()
+    assert system.face_cascade.calls == 2
+    assert system.ref_ids == ['student_0', 'student_1']
+
+def test_unchanged_photos_come_from_cache(system):
+    rois = system.ref_rois.copy()
+    system.face_cascade.calls = 0
+    
+    system.load_reference_faces()
+    
+    assert system.face_cascade.calls == 0
+    np.testing.assert_array_equal(system.ref_rois, rois)
+    assert [tuple(c) for c in system.ref_coords] == [(10, 20, 100, 120)] * 2
+
+def test_touched_photo_is_redone(system, photos):
+    system.face_cascade.calls = 0
+    stat = os.stat(photos[0])
+    os.utime(photos[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    
+    system.load_reference_faces()
+    
+    assert system.face_cascade.calls == 1
+
+def test_replaced_photo_is_redone(system, photos):
+    system.face_cascade.calls = 0
+    cv2.imwrite(str(photos[1]), np.full((240, 240, 3), 90, dtype=np.uint8))
+    
+    system.load_reference_faces()
+    
+    assert system.face_cascade.calls == 1
+
+def test_detector_change_redoes_every_photo(system):
+    system.face_cascade.calls = 0
+    system.detector_name = 'haar'
+    
+    system.load_reference_faces()
+    
+    assert system.face_cascade.calls == 2
@@ -0,0 +1,63 @@
+"""
+the attendance loop with the camera and window stubbed out
+"""
+
+import sqlite3
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+class FakeCamera:
+    """always has the same frame ready"""
+    
+    def __init__(self, index):
+        self.frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    
+    def isOpened(self):
+        return True
+    
+    def set(self, prop, value):
+        return True
+    
+    def read(self):
+        time.sleep(0.005)
+        return True, self.frame.copy()
+    
+    def release(self):
+        pass
+
+@pytest.fixture
+def run_loop(system, monkeypatch):
+    """runs the loop, pressing one key per frame, until the keys run out"""
+    def run(keys):
+        keys = iter(keys)
+        monkeypatch.setattr(cv2, 'VideoCapture', FakeCamera)
+        monkeypatch.setattr(cv2, 'imshow', lambda *args: None)
+        monkeypatch.setattr(cv2, 'destroyAllWindows', lambda: None)
+        monkeypatch.setattr(cv2, 'waitKey', lambda delay: next(keys, ord('q')))
+        system.run_attendance()
+    return run
+
+def test_reload_then_frame_between_detections(system, students_db, run_loop):
+    #every face matches whoever is last in the reference list
+    system.recognize_faces = lambda frame, faces: [
+        (len(system.ref_ids) - 1, 0.9) for _ in faces
+    ]
+    
+    def press_reload():
+        #student_1 leaves, so index 1 no longer exists after the reload
+        conn = sqlite3.connect(students_db)
+        conn.execute("UPDATE students SET active = FALSE WHERE student_id = 'student_1'")
+        conn.commit()
+        conn.close()
+        return ord('r')
+    
+    keys = (press_reload() if i == 0 else 0 for i in range(2))
+    run_loop(keys)
+    
+    #the frame after the reload is a detection frame and matches the new list
+    assert system.ref_ids == ['student_0']
+    assert system.recorded_today == {'student_1', 'student_0'}
+    assert system.last_recognitions == [(0, 0.9)]